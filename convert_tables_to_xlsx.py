@@ -3,59 +3,328 @@ Convert HTML tables in MultiHiertt JSON files to XLSX.
 
 For each example UID, this script writes one XLSX per table:
   <out>/<uid>/table{n}.xlsx
+or, with --single-workbook, one XLSX per UID holding a sheet per table:
+  <out>/<uid>/tables.xlsx  (sheets "table{n}")
 
 Usage:
     python3 convert_tables_to_xlsx.py --src lightning_modules/datasets/test.json --out extracted_xlsx/test
 """
 
 import argparse
+import io
+import itertools
 import json
+import math
+import mmap
+import numbers
+import os
 import pathlib
-from typing import Any, Dict, List
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from xml.sax.saxutils import escape
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup, fall back to stdlib json
+    orjson = None
+
+try:
+    import lxml.html
+except ImportError:  # pragma: no cover - only needed for --no-pandas
+    lxml = None
+
+# Static parts of a minimal single-sheet workbook (no styles, no shared strings).
+_CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    "</Types>"
+)
+_ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>'
+    "</workbook>"
+)
+_WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    "</Relationships>"
+)
+# pandas module and xlsxwriter Workbook class, imported per worker process by _init_worker.
+_pd = None
+_Workbook = None
+# One HTML parser per process, reused for every table in --no-pandas mode.
+_HTML_PARSER = lxml.html.HTMLParser() if lxml is not None else None
+# Literal "_xHHHH_" text, which Excel would otherwise read back as an escaped character.
+_XL_ESCAPE_RE = re.compile(r"(_x[0-9a-fA-F]{4}_)")
+# Control characters that are not allowed in XML; Excel stores them as "_xHHHH_".
+_XL_CONTROL_RE = re.compile(r"[\x00-\x08\x0b-\x1f]")
+# dtype kinds the fast writer handles: object (strings/NaN), integers and floats.
+_FAST_DTYPE_KINDS = frozenset("Oiuf")
 
 
 def load_examples(path: pathlib.Path) -> List[Dict[str, Any]]:
-    with path.open() as f:
-        return json.load(f)
+    with path.open("rb") as f:
+        if orjson is None:
+            return json.load(f)
+        # Parse straight from the mapped file instead of reading it into a bytes copy first.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            return orjson.loads(view)
+
+
+def _column_letter(col: int) -> str:
+    """Convert a zero-based column index to an Excel column name (0 -> A, 26 -> AA)."""
+    letters = ""
+    col += 1
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def _escape_text(text: str) -> str:
+    """Escape cell text for inline XML the way xlsxwriter does, so control characters survive the round trip."""
+    text = _XL_ESCAPE_RE.sub(r"_x005F\1", text)
+    text = _XL_CONTROL_RE.sub(lambda m: f"_x{ord(m.group()):04X}_", text)
+    text = text.replace("\ufffe", "_xFFFE_").replace("\uffff", "_xFFFF_")
+    return escape(text)
+
+
+def _cell_xml(ref: str, value: Any) -> str:
+    if value is None or value == "" or (isinstance(value, float) and math.isnan(value)):
+        # Missing values and empty strings stay blank, like pandas' default na_rep.
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, numbers.Real) and math.isfinite(value):
+        # Same number formatting as xlsxwriter, so 1.0 is stored as 1.
+        return f'<c r="{ref}"><v>{float(value):.16G}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{_escape_text(str(value))}</t></is></c>'
+
+
+def _sheet_xml(rows: Iterable[Iterable[Any]]) -> str:
+    buf = io.StringIO()
+    buf.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
+    buf.write('<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+    for row_num, row in enumerate(rows, start=1):
+        buf.write(f'<row r="{row_num}">')
+        for col, value in enumerate(row):
+            buf.write(_cell_xml(f"{_column_letter(col)}{row_num}", value))
+        buf.write("</row>")
+    buf.write("</sheetData></worksheet>")
+    return buf.getvalue()
+
+
+def html_table_to_rows(html: str) -> List[List[List[str]]]:
+    """
+    Extract the cell text of every <table> in `html`, as one list of rows per table.
+
+    Unlike pandas.read_html there is no header detection, span expansion or number parsing.
+    Tables without any rows are dropped, as pandas.read_html does.
+    """
+    root = lxml.html.fragment_fromstring(html, create_parent="div", parser=_HTML_PARSER)
+    tables = (
+        [[" ".join(cell.text_content().split()) for cell in row if cell.tag in ("td", "th")] for row in table.iter("tr")]
+        for table in root.iter("table")
+    )
+    return [rows for rows in tables if rows]
+
+
+def can_write_fast(df) -> bool:
+    """Whether `write_xlsx_fast` can reproduce `df.to_excel(index=False)` for this DataFrame."""
+    return df.columns.nlevels == 1 and all(dtype.kind in _FAST_DTYPE_KINDS for dtype in df.dtypes)
+
+
+def write_xlsx_fast(df, path: pathlib.Path) -> None:
+    """
+    Write a values-only DataFrame (header row + data rows) as a single-sheet XLSX.
+
+    The workbook XML is emitted directly with inline strings, skipping the object model
+    and style bookkeeping of the pandas Excel writers.
+    """
+    write_xlsx_rows(itertools.chain([list(df.columns)], df.itertuples(index=False, name=None)), path)
+
+
+def write_xlsx_rows(rows: Iterable[Iterable[Any]], path: pathlib.Path) -> None:
+    """Write rows of plain values as a single-sheet XLSX; backs `write_xlsx_fast` and --no-pandas mode."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES_XML)
+        zf.writestr("_rels/.rels", _ROOT_RELS_XML)
+        zf.writestr("xl/workbook.xml", _WORKBOOK_XML)
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS_XML)
+        zf.writestr("xl/worksheets/sheet1.xml", _sheet_xml(rows))
+
+
+def _excel_value(value: Any) -> Any:
+    # xlsxwriter rejects non-finite numbers; to_excel and _cell_xml write them as "inf"/"-inf".
+    if isinstance(value, float) and math.isinf(value):
+        return "inf" if value > 0 else "-inf"
+    return value
 
 
-def export_tables(uid: str, tables: List[str], out_dir: pathlib.Path, pd_module) -> None:
+def frame_rows(df) -> Iterator[Tuple[Any, ...]]:
+    """
+    Yield the header and data rows of `df` as plain Python values.
+
+    Missing cells become None and infinities "inf"/"-inf", matching the per-file writers.
+    """
+    yield tuple(df.columns)
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        yield tuple(map(_excel_value, row))
+
+
+def write_single_workbook(xlsx_path: pathlib.Path, named_tables: Iterable[Tuple[str, Any]], use_pandas: bool) -> None:
+    """Write every (sheet name, table) pair as one sheet of a single workbook; nothing is written if there are none."""
+    wb = None
+    for sheet_name, table in named_tables:
+        if wb is None:
+            wb = _Workbook(str(xlsx_path), {"constant_memory": True, "strings_to_urls": False})
+        ws = wb.add_worksheet(sheet_name)
+        # Without pandas, `table` is already a list of cell-text rows.
+        rows = frame_rows(table) if use_pandas else table
+        for row_num, row in enumerate(rows):
+            ws.write_row(row_num, 0, row)
+    if wb is not None:
+        wb.close()
+
+
+def _init_worker(use_pandas: bool, single_workbook: bool) -> None:
+    """Import pandas (and xlsxwriter) once when a worker process starts, before it receives any examples."""
+    global _pd, _Workbook
+    if use_pandas:
+        import pandas  # type: ignore
+
+        _pd = pandas
+    if single_workbook:
+        from xlsxwriter import Workbook  # type: ignore
+
+        _Workbook = Workbook
+
+
+def _read_tables(html: str, use_pandas: bool) -> List[Any]:
+    if not use_pandas:
+        return html_table_to_rows(html)
+    try:
+        return _pd.read_html(html, flavor="lxml")
+    except ValueError:
+        # No tables parsed; skip.
+        return []
+
+
+def _iter_tables(tables: List[str], use_pandas: bool) -> Iterator[Tuple[str, Any]]:
+    """Yield (name, table) for every table parsed from the example's HTML cells, e.g. "table0" or "table2_1"."""
+    for idx, html in enumerate(tables):
+        parsed = _read_tables(html, use_pandas)
+        for sub_idx, table in enumerate(parsed):
+            suffix = f"{idx}" if len(parsed) == 1 else f"{idx}_{sub_idx}"
+            yield f"table{suffix}", table
+
+
+def export_tables(
+    uid: str, tables: List[str], out_dir: pathlib.Path, use_pandas: bool = True, single_workbook: bool = False
+) -> None:
+    """Export one example's tables; usually runs in a worker process set up by `_init_worker`."""
+    if (use_pandas and _pd is None) or (single_workbook and _Workbook is None):
+        # Called outside the process pool: import what this call needs now.
+        _init_worker(use_pandas, single_workbook)
     example_dir = out_dir / uid
     example_dir.mkdir(parents=True, exist_ok=True)
-    for idx, html in enumerate(tables):
-        try:
-            dfs = pd_module.read_html(html)
-        except ValueError:
-            # No tables parsed; skip.
-            continue
-        for sub_idx, df in enumerate(dfs):
-            suffix = f"{idx}" if len(dfs) == 1 else f"{idx}_{sub_idx}"
-            xlsx_path = example_dir / f"table{suffix}.xlsx"
-            df.to_excel(xlsx_path, index=False)
+    if single_workbook:
+        write_single_workbook(example_dir / "tables.xlsx", _iter_tables(tables, use_pandas), use_pandas)
+        return
+
+    for name, table in _iter_tables(tables, use_pandas):
+        xlsx_path = example_dir / f"{name}.xlsx"
+        if not use_pandas:
+            # Without pandas, `table` is already a list of cell-text rows.
+            write_xlsx_rows(table, xlsx_path)
+        elif can_write_fast(table):
+            write_xlsx_fast(table, xlsx_path)
+        else:
+            table.to_excel(xlsx_path, index=False, engine="xlsxwriter")
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Convert HTML tables in MultiHiertt JSON to XLSX files.")
     parser.add_argument("--src", required=True, type=pathlib.Path, help="Path to source JSON (e.g., lightning_modules/datasets/test.json).")
     parser.add_argument("--out", required=True, type=pathlib.Path, help="Output directory to store XLSX files.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default: CPU count).")
+    parser.add_argument(
+        "--no-pandas",
+        action="store_true",
+        help="Copy raw cell text with lxml instead of pandas.read_html (no header detection or number parsing).",
+    )
+    parser.add_argument(
+        "--single-workbook",
+        action="store_true",
+        help="Write one tables.xlsx per UID with a sheet per table instead of one XLSX file per table.",
+    )
     args = parser.parse_args()
 
     examples = load_examples(args.src)
     args.out.mkdir(parents=True, exist_ok=True)
 
-    # Import pandas lazily so the script can give a clear error if it's missing.
-    try:
-        import pandas as pd  # type: ignore
-    except ModuleNotFoundError as exc:  # pragma: no cover - informative failure path
-        raise SystemExit(
-            "pandas is required to convert HTML tables to XLSX. "
-            "Install it (e.g., `python3 -m pip install -r requirements.txt`) and rerun."
-        ) from exc
-
-    for example in examples:
-        uid = example.get("uid", "unknown_uid")
-        tables = example.get("tables", [])
-        export_tables(uid, tables, args.out, pd)
+    use_pandas = not args.no_pandas
+    if use_pandas:
+        # Import pandas lazily so the script can give a clear error if it's missing.
+        try:
+            import pandas  # type: ignore  # noqa: F401
+        except ModuleNotFoundError as exc:  # pragma: no cover - informative failure path
+            raise SystemExit(
+                "pandas is required to convert HTML tables to XLSX. "
+                "Install it (e.g., `python3 -m pip install -r requirements.txt`) and rerun."
+            ) from exc
+    elif lxml is None:  # pragma: no cover - informative failure path
+        raise SystemExit("lxml is required for --no-pandas. Install it (e.g., `python3 -m pip install lxml`) and rerun.")
+    if args.single_workbook:
+        try:
+            import xlsxwriter  # type: ignore  # noqa: F401
+        except ModuleNotFoundError as exc:  # pragma: no cover - informative failure path
+            raise SystemExit(
+                "xlsxwriter is required for --single-workbook. "
+                "Install it (e.g., `python3 -m pip install -r requirements.txt`) and rerun."
+            ) from exc
+
+    # Each example writes to its own <out>/<uid>/ directory, so workers never collide.
+    workers = max(1, args.workers or 1)
+    uids = [example.get("uid", "unknown_uid") for example in examples]
+    tables = [example.get("tables", []) for example in examples]
+    chunksize = max(1, len(examples) // (4 * workers))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(use_pandas, args.single_workbook)
+    ) as executor:
+        jobs = executor.map(
+            export_tables,
+            uids,
+            tables,
+            itertools.repeat(args.out),
+            itertools.repeat(use_pandas),
+            itertools.repeat(args.single_workbook),
+            chunksize=chunksize,
+        )
+        # Drain the iterator so worker exceptions surface here.
+        for _ in jobs:
+            pass
 
 
 if __name__ == "__main__":
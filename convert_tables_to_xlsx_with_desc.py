@@ -14,21 +14,42 @@ Usage:
 
 import argparse
 import json
+import math
+import mmap
+import os
 import pathlib
 import re
-from typing import Any, Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-import pandas as pd
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup, fall back to stdlib json
+    orjson = None
+
+try:
+    import lxml.html
+except ImportError:  # pragma: no cover - only needed for --no-pandas
+    lxml = None
 
 # Paragraph markers look like "## Table 0 ##".
 TABLE_MARKER_RE = re.compile(r"##\s*Table\s*(\d+)\s*##")
-# Characters Excel will reject.
-INVALID_XL_CHARS = re.compile(r"[\x00-\x08\x0b-\x0c\x0e-\x1f]")
+# Characters Excel will reject, as a str.translate table that deletes them.
+_INVALID_XL_TRANS = dict.fromkeys([*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20)], None)
+# pandas module and xlsxwriter Workbook class, imported per worker process by _init_worker.
+_pd = None
+_Workbook = None
+# One HTML parser per process, reused for every table in --no-pandas mode.
+_HTML_PARSER = lxml.html.HTMLParser() if lxml is not None else None
 
 
 def load_examples(path: pathlib.Path) -> List[Dict[str, Any]]:
-    with path.open() as f:
-        return json.load(f)
+    with path.open("rb") as f:
+        if orjson is None:
+            return json.load(f)
+        # Parse straight from the mapped file instead of reading it into a bytes copy first.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            return orjson.loads(view)
 
 
 def extract_descriptions(paragraphs: List[str]) -> Dict[int, str]:
@@ -37,63 +58,176 @@ def extract_descriptions(paragraphs: List[str]) -> Dict[int, str]:
 
     We treat paragraphs between \"## Table k ##\" and the next table marker as the description for table k.
     """
-    starts: List[Tuple[int, int]] = []  # (table_idx, paragraph_pos)
-    for pos, para in enumerate(paragraphs):
-        m = TABLE_MARKER_RE.search(para)
-        if m:
-            starts.append((int(m.group(1)), pos))
-
     descriptions: Dict[int, str] = {}
-    for i, (table_idx, start_pos) in enumerate(starts):
-        end_pos = starts[i + 1][1] if i + 1 < len(starts) else len(paragraphs)
-        chunk = paragraphs[start_pos + 1 : end_pos]
-        text = "\n".join(chunk).strip()
-        descriptions[table_idx] = text
+    table_idx: Optional[int] = None  # table whose description is being collected
+    chunk: List[str] = []
+    for para in paragraphs:
+        # Markers sit at the start of a paragraph; skip the regex for the common marker-free case.
+        if "##" in para:
+            m = TABLE_MARKER_RE.match(para.lstrip())
+            if m:
+                if table_idx is not None:
+                    descriptions[table_idx] = "\n".join(chunk).strip()
+                table_idx = int(m.group(1))
+                chunk = []
+                continue
+        if table_idx is not None:
+            chunk.append(para)
+    if table_idx is not None:
+        descriptions[table_idx] = "\n".join(chunk).strip()
     return descriptions
 
 
 def sanitize_for_excel(text: str) -> str:
     """Remove characters that cannot be stored in an Excel cell."""
-    return INVALID_XL_CHARS.sub("", text)
+    return text.translate(_INVALID_XL_TRANS)
+
+
+def html_table_to_rows(html: str) -> List[List[List[str]]]:
+    """
+    Extract the cell text of every <table> in `html`, as one list of rows per table.
+
+    Unlike pandas.read_html there is no header detection, span expansion or number parsing.
+    Tables without any rows are dropped, as pandas.read_html does.
+    """
+    root = lxml.html.fragment_fromstring(html, create_parent="div", parser=_HTML_PARSER)
+    tables = (
+        [[" ".join(cell.text_content().split()) for cell in row if cell.tag in ("td", "th")] for row in table.iter("tr")]
+        for table in root.iter("table")
+    )
+    return [rows for rows in tables if rows]
 
 
-def export_tables(uid: str, tables: List[str], paragraphs: List[str], out_dir: pathlib.Path) -> None:
+def _excel_value(value: Any) -> Any:
+    # xlsxwriter rejects non-finite numbers; to_excel writes them as its inf_rep strings.
+    if isinstance(value, float) and math.isinf(value):
+        return "inf" if value > 0 else "-inf"
+    return value
+
+
+def frame_rows(df) -> Iterator[Tuple[Any, ...]]:
+    """
+    Yield the header and data rows of `df` as plain Python values.
+
+    Missing cells become None and infinities "inf"/"-inf", as df.to_excel stores them.
+    """
+    yield tuple(df.columns)
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        yield tuple(map(_excel_value, row))
+
+
+def write_workbook(xlsx_path: pathlib.Path, rows: Iterable[Sequence[Any]], desc_text: str) -> None:
+    """Write the table rows and, in a second sheet, the description text in one xlsxwriter pass."""
+    # constant_memory flushes each row to disk as soon as the next one starts.
+    wb = _Workbook(str(xlsx_path), {"constant_memory": True, "strings_to_urls": False})
+    table_ws = wb.add_worksheet("table")
+    for row_num, row in enumerate(rows):
+        table_ws.write_row(row_num, 0, row)
+    # Store description text in a second sheet.
+    desc_ws = wb.add_worksheet("description")
+    desc_ws.write_string(0, 0, "description")
+    if desc_text:
+        # Leave the cell blank for a missing description, as to_excel does for "".
+        desc_ws.write_string(1, 0, desc_text)
+    wb.close()
+
+
+def _init_worker(use_pandas: bool) -> None:
+    """Import pandas and xlsxwriter once when a worker process starts, before it receives any examples."""
+    global _pd, _Workbook
+    from xlsxwriter import Workbook  # type: ignore
+
+    _Workbook = Workbook
+    if use_pandas:
+        import pandas  # type: ignore
+
+        _pd = pandas
+
+
+def _read_tables(html: str, use_pandas: bool) -> List[Any]:
+    if not use_pandas:
+        return html_table_to_rows(html)
+    try:
+        return _pd.read_html(html, flavor="lxml")
+    except ValueError:
+        # No tables parsed; skip.
+        return []
+
+
+def export_tables(
+    uid: str, tables: List[str], paragraphs: List[str], out_dir: pathlib.Path, use_pandas: bool = True
+) -> None:
+    """Export one example's tables with descriptions; usually runs in a worker process set up by `_init_worker`."""
+    if _Workbook is None or (use_pandas and _pd is None):
+        # Called outside the process pool: import what this call needs now.
+        _init_worker(use_pandas)
     desc_map = extract_descriptions(paragraphs)
     example_dir = out_dir / uid
     example_dir.mkdir(parents=True, exist_ok=True)
 
     for idx, html in enumerate(tables):
-        try:
-            dfs = pd.read_html(html)
-        except ValueError:
-            # No tables parsed; skip.
-            continue
-
-        for sub_idx, df in enumerate(dfs):
-            suffix = f"{idx}" if len(dfs) == 1 else f"{idx}_{sub_idx}"
+        parsed = _read_tables(html, use_pandas)
+        for sub_idx, table in enumerate(parsed):
+            suffix = f"{idx}" if len(parsed) == 1 else f"{idx}_{sub_idx}"
             xlsx_path = example_dir / f"table{suffix}.xlsx"
             desc_text = sanitize_for_excel(desc_map.get(idx, ""))
 
-            with pd.ExcelWriter(xlsx_path, engine="openpyxl") as writer:
-                df.to_excel(writer, index=False, sheet_name="table")
-                # Store description text in a second sheet.
-                pd.DataFrame({"description": [desc_text]}).to_excel(writer, index=False, sheet_name="description")
+            # Without pandas, `table` is already a list of cell-text rows.
+            rows = frame_rows(table) if use_pandas else table
+            write_workbook(xlsx_path, rows, desc_text)
+
+
+def _process_example(job: Tuple[str, List[str], List[str], pathlib.Path, bool]) -> None:
+    uid, tables, paragraphs, out_dir, use_pandas = job
+    export_tables(uid, tables, paragraphs, out_dir, use_pandas)
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Convert HTML tables in MultiHiertt JSON to XLSX files with descriptions.")
     parser.add_argument("--src", required=True, type=pathlib.Path, help="Path to source JSON (e.g., lightning_modules/datasets/train.json).")
     parser.add_argument("--out", required=True, type=pathlib.Path, help="Output directory to store XLSX files.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default: CPU count).")
+    parser.add_argument(
+        "--no-pandas",
+        action="store_true",
+        help="Copy raw cell text with lxml instead of pandas.read_html (no header detection or number parsing).",
+    )
     args = parser.parse_args()
 
     examples = load_examples(args.src)
     args.out.mkdir(parents=True, exist_ok=True)
 
-    for example in examples:
-        uid = example.get("uid", "unknown_uid")
-        tables = example.get("tables", [])
-        paragraphs = example.get("paragraphs", [])
-        export_tables(uid, tables, paragraphs, args.out)
+    use_pandas = not args.no_pandas
+    # Check the dependencies up front so the script gives a clear error instead of failing in every worker.
+    try:
+        if use_pandas:
+            import pandas  # type: ignore  # noqa: F401
+        import xlsxwriter  # type: ignore  # noqa: F401
+    except ModuleNotFoundError as exc:  # pragma: no cover - informative failure path
+        raise SystemExit(
+            "pandas and xlsxwriter are required to convert HTML tables to XLSX. "
+            "Install them (e.g., `python3 -m pip install -r requirements.txt`) and rerun."
+        ) from exc
+    if not use_pandas and lxml is None:  # pragma: no cover - informative failure path
+        raise SystemExit("lxml is required for --no-pandas. Install it (e.g., `python3 -m pip install lxml`) and rerun.")
+
+    # Each example writes to its own <out>/<uid>/ directory, so workers never collide.
+    jobs = (
+        (
+            example.get("uid", "unknown_uid"),
+            example.get("tables", []),
+            example.get("paragraphs", []),
+            args.out,
+            use_pandas,
+        )
+        for example in examples
+    )
+    with ProcessPoolExecutor(
+        max_workers=max(1, args.workers or 1), initializer=_init_worker, initargs=(use_pandas,)
+    ) as executor:
+        # Drain the iterator so worker exceptions surface here.
+        for _ in executor.map(_process_example, jobs, chunksize=16):
+            pass
 
 
 if __name__ == "__main__":
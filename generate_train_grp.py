@@ -13,22 +13,82 @@ Output schema per entry:
 }
 """
 
+import argparse
 import json
+import mmap
+import os
+import re
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Tuple, Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup, fall back to stdlib json
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional, fall back to loading the whole file
+    ijson = None
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - optional, fall back to one substring check per needle
+    ahocorasick = None
+
+# Title candidates start with "Table " (any case); tables of contents are skipped.
+_TITLE_RE = re.compile(r"table ", re.IGNORECASE)
+_TOC_RE = re.compile(r"table of contents", re.IGNORECASE)
+
+
+class CompiledRules(NamedTuple):
+    """Feedback rules for one question type, prepared for matching against program strings."""
+
+    rules: List[Tuple[FrozenSet[int], str]]  # (required needle ids, feedback), in priority order
+    needles: Dict[str, int]  # needle -> id
+    automaton: Any  # ahocorasick.Automaton over `needles`, or None
+
+
+def _load_json(path: Path) -> Any:
+    with path.open("rb") as f:
+        if orjson is None:
+            return json.load(f)
+        # Parse straight from the mapped file instead of reading it into a bytes copy first.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            return orjson.loads(view)
 
 
 def load_train(train_path: Path) -> List[Dict[str, Any]]:
-    with train_path.open() as f:
-        return json.load(f)
+    return _load_json(train_path)
+
+
+def iter_train(train_path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield training examples one at a time, streaming the file when ijson is available."""
+    if ijson is None:
+        yield from load_train(train_path)
+        return
+    with train_path.open("rb") as f:
+        # use_float keeps non-integral numbers as float rather than Decimal.
+        yield from ijson.items(f, "item", use_float=True)
+
 
+def build_spreadsheet_index(base_dir: str) -> Dict[str, List[str]]:
+    """Map each UID folder name under base_dir to its sorted XLSX paths, in a single directory walk."""
+    index: Dict[str, List[str]] = {}
+    if not os.path.isdir(base_dir):
+        return index
+    with os.scandir(base_dir) as folders:
+        for folder in folders:
+            if not folder.is_dir():
+                continue
+            with os.scandir(folder.path) as entries:
+                index[folder.name] = sorted(entry.path for entry in entries if entry.name.endswith(".xlsx"))
+    return index
 
-def gather_spreadsheets(base_dir: Path, uid: str) -> List[str]:
-    """List XLSX files for a given UID folder."""
-    folder = base_dir / f"Train_{uid}"
-    if not folder.exists():
-        return []
-    return sorted(str(p) for p in folder.glob("*.xlsx"))
+
+def gather_spreadsheets(spreadsheet_index: Dict[str, List[str]], uid: str) -> List[str]:
+    """List XLSX files for a given UID folder (per-table files, or tables.xlsx from --single-workbook)."""
+    return spreadsheet_index.get(f"Train_{uid}", [])
 
 
 def derive_title(paragraphs: List[str], question: str, uid: str) -> str:
@@ -45,8 +105,7 @@ def derive_title(paragraphs: List[str], question: str, uid: str) -> str:
             continue
         if not first_non_empty:
             first_non_empty = text
-        lower = text.lower()
-        if lower.startswith("table ") and "table of contents" not in lower:
+        if _TITLE_RE.match(text) and not _TOC_RE.search(text):
             return text
     if first_non_empty:
         return " ".join(first_non_empty.split()[:15])
@@ -57,32 +116,72 @@ def load_rules(rules_path: Path) -> Dict[str, Any]:
     """Load feedback rules; return empty mapping if file is missing."""
     if not rules_path.exists():
         return {}
-    with rules_path.open() as f:
-        return json.load(f)
+    return _load_json(rules_path)
+
+
+def _compile_rule_list(rule_list: List[Dict[str, Any]]) -> CompiledRules:
+    needles: Dict[str, int] = {}
+    compiled: List[Tuple[FrozenSet[int], str]] = []
+    for rule in rule_list:
+        # An empty needle is contained in every program, so it never rules a match out.
+        required = frozenset(
+            needles.setdefault(needle, len(needles)) for needle in rule.get("program_contains", []) if needle
+        )
+        compiled.append((required, rule.get("feedback", "")))
+
+    automaton = None
+    if ahocorasick is not None and needles:
+        automaton = ahocorasick.Automaton()
+        for needle, needle_id in needles.items():
+            automaton.add_word(needle, needle_id)
+        automaton.make_automaton()
+    return CompiledRules(compiled, needles, automaton)
 
 
-def generate_feedback(rules: Dict[str, Any], question_type: str, program: str) -> str:
+def compile_rules(rules: Dict[str, Any]) -> Dict[str, CompiledRules]:
+    """
+    Prepare the feedback rules once per question type.
+    Each type's rules are followed by the default rules; the "default" entry holds the default rules alone
+    and serves question types without specific rules.
+    """
+    rule_set = rules.get("question_type_rules", {})
+    default_rules = rule_set.get("default", [])
+    compiled = {
+        question_type: _compile_rule_list(type_rules + default_rules)
+        for question_type, type_rules in rule_set.items()
+        if question_type != "default"
+    }
+    compiled["default"] = _compile_rule_list(default_rules)
+    return compiled
+
+
+def generate_feedback(compiled: Dict[str, CompiledRules], question_type: str, program: str) -> str:
     """
     Pick the first feedback template whose program substrings all appear.
     Falls back to default rules if no question-type-specific rule matches.
     """
-    rule_set = rules.get("question_type_rules", {})
-    ordered_rules = rule_set.get(question_type, []) + rule_set.get("default", [])
-    for rule in ordered_rules:
-        needles = rule.get("program_contains", [])
-        if all(needle in program for needle in needles):
-            return rule.get("feedback", "")
+    rule_set = compiled.get(question_type, compiled["default"])
+    # Find every needle present in the program in one scan, then check rules by set inclusion.
+    if rule_set.automaton is not None:
+        found = {needle_id for _, needle_id in rule_set.automaton.iter(program)}
+    else:
+        found = {needle_id for needle, needle_id in rule_set.needles.items() if needle in program}
+    for required, feedback in rule_set.rules:
+        if required <= found:
+            return feedback
     return ""
 
 
-def build_entry(example: Dict[str, Any], base_dir: Path, rules: Dict[str, Any]) -> Dict[str, Any]:
+def build_entry(
+    example: Dict[str, Any], spreadsheet_index: Dict[str, List[str]], rules: Dict[str, CompiledRules]
+) -> Dict[str, Any]:
     uid = str(example.get("uid", "")).strip()
     question = example.get("qa", {}).get("question", "")
     answer = example.get("qa", {}).get("answer", "")
     question_type = example.get("qa", {}).get("question_type") or "default"
     program = example.get("qa", {}).get("program", "") or ""
     paragraphs = example.get("paragraphs", [])
-    spreadsheets = gather_spreadsheets(base_dir, uid)
+    spreadsheets = gather_spreadsheets(spreadsheet_index, uid)
     title = derive_title(paragraphs, question, uid)
     return {
         "task_id": f"Test {uid}",
@@ -95,18 +194,64 @@ def build_entry(example: Dict[str, Any], base_dir: Path, rules: Dict[str, Any])
     }
 
 
+def _dump_entry(entry: Dict[str, Any], indent: bool) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(entry, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    if indent:
+        return json.dumps(entry, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_entries(entries: Iterable[Dict[str, Any]], out_path: Path, pretty: bool = False) -> None:
+    """
+    Write entries as a JSON array, one entry at a time.
+
+    With orjson (whose indentation is implemented in C) or `pretty`, the layout matches
+    json.dump(..., indent=2) of the whole list; otherwise the stdlib writes compact JSON.
+    The array goes to a temporary file that replaces `out_path` only once every entry is written,
+    so a missing or malformed input leaves the previous output untouched.
+    """
+    indent = pretty or orjson is not None
+    first_sep, sep, end = (b"\n", b",\n", b"\n]") if indent else (b"", b",", b"]")
+    wrote = False
+    tmp_path = out_path.with_suffix(".tmp")
+    try:
+        with tmp_path.open("wb") as f:
+            f.write(b"[")
+            for entry in entries:
+                chunk = _dump_entry(entry, indent)
+                if indent:
+                    chunk = b"\n".join(b"  " + line for line in chunk.split(b"\n"))
+                f.write(sep if wrote else first_sep)
+                f.write(chunk)
+                wrote = True
+            # An empty list is written as "[]", like json.dump.
+            f.write(end if wrote else b"]")
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, out_path)
+
+
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a GRP-style JSON from MultiHiertt train data.")
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Indent the output JSON even without orjson (orjson output is always indented).",
+    )
+    args = parser.parse_args()
+
     train_path = Path("lightning_modules/datasets/train.json")
     out_path = Path("train_GRP.json")
-    base_dir = Path("extracted_xlsx/train")
+    # Plain str: the spreadsheet index is built with os.scandir, no Path objects needed.
+    base_dir = "extracted_xlsx/train"
     rules_path = Path("rules.json")
 
-    examples = load_train(train_path)
-    rules = load_rules(rules_path)
-    output = [build_entry(ex, base_dir, rules) for ex in examples]
-
-    with out_path.open("w") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+    rules = compile_rules(load_rules(rules_path))
+    spreadsheet_index = build_spreadsheet_index(base_dir)
+    entries = (build_entry(ex, spreadsheet_index, rules) for ex in iter_train(train_path))
+    write_entries(entries, out_path, pretty=args.pretty)
 
 
 if __name__ == "__main__":
@@ -7,24 +7,43 @@ Usage:
 
 import argparse
 import json
+import mmap
 from pathlib import Path
 from typing import List, Dict, Any
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup, fall back to stdlib json
+    orjson = None
+
 
 def load_examples(path: Path) -> List[Dict[str, Any]]:
-    with path.open() as f:
-        return json.load(f)
+    with path.open("rb") as f:
+        if orjson is None:
+            return json.load(f)
+        # Parse straight from the mapped file instead of reading it into a bytes copy first.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            return orjson.loads(view)
 
 
 def renumber_uids(examples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    for idx, example in enumerate(examples, start=1):
-        example["uid"] = str(idx)
+    # map/zip keep the int-to-str conversion and the pairing out of the Python loop body.
+    for example, uid in zip(examples, map(str, range(1, len(examples) + 1))):
+        example["uid"] = uid
     return examples
 
 
-def save_examples(examples: List[Dict[str, Any]], path: Path) -> None:
+def save_examples(examples: List[Dict[str, Any]], path: Path, pretty: bool = False) -> None:
+    # orjson indents in C, so its output is always indented; the stdlib's pure-Python indent is opt-in.
+    if orjson is not None:
+        with path.open("wb") as f:
+            f.write(orjson.dumps(examples, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
     with path.open("w") as f:
-        json.dump(examples, f, ensure_ascii=False, indent=2)
+        if pretty:
+            json.dump(examples, f, ensure_ascii=False, indent=2)
+        else:
+            json.dump(examples, f, ensure_ascii=False, separators=(",", ":"))
 
 
 def main() -> None:
@@ -36,13 +55,18 @@ def main() -> None:
         type=Path,
         help="Path to write the updated JSON. Defaults to the input path for in-place update.",
     )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Indent the output JSON even without orjson (orjson output is always indented).",
+    )
     args = parser.parse_args()
 
     output_path = args.output if args.output is not None else args.input
 
     examples = load_examples(args.input)
     examples = renumber_uids(examples)
-    save_examples(examples, output_path)
+    save_examples(examples, output_path, pretty=args.pretty)
 
 
 if __name__ == "__main__":